@@ -0,0 +1,172 @@
+import asyncio
+import os
+import random
+import time
+from collections import namedtuple
+
+import aiohttp
+
+import metrics
+from corpus import corpus
+from gateway import gateway
+
+# same list animalpy checks against
+ANIMALS = ["dog", "cat", "raccoon", "panda", "kangaroo", "koala", "fox", "bird"]
+
+API_URL = os.environ.get("ANIMAL_API", "https://some-random-api.ml")
+
+# one upstream hit gives us both, so we keep both
+Animal = namedtuple("Animal", ["fact", "image"])
+
+
+class AnimalClient:
+    """
+    Async stand-in for animalpy's `animals`.
+
+    Keeps one keep-alive session around so every fetch reuses the same pool
+    of connections instead of opening a new one each time like requests.get does.
+
+    With a corpus, everything fetched gets remembered, and if upstream takes longer
+    than `budget` seconds (or errors) we answer from the corpus instead. `mix` is
+    the share of fetches that go straight to the corpus even when upstream is fine.
+
+    With a gateway, upstream requests are coalesced and limited by it (see gateway.py).
+    """
+
+    def __init__(self, url=API_URL, timeout=5.0, connections=10, corpus=None, budget=None, mix=0.0, gateway=None):
+        self.url = url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.connections = connections
+        self.session = None
+        self.corpus = corpus
+        self.budget = budget
+        self.mix = mix
+        self.gateway = gateway
+
+    def _session(self):
+        # made lazily so it gets bound to the loop that's actually running
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60),
+                timeout=self.timeout,
+            )
+        return self.session
+
+    def _check_animal(self, animal):
+        if animal.lower() not in ANIMALS:
+            raise AttributeError("The animal given doesnt exist! Make sure the animal you want an fact of is in the respected queries!")
+
+    async def _get(self, animal):
+        start = time.perf_counter()
+        try:
+            async with self._session().get(f"{self.url}/animal/{animal}") as resp:
+                resp.raise_for_status()
+                json = await resp.json(content_type=None)
+        except asyncio.TimeoutError:
+            metrics.upstream_timeouts.inc(animal=animal)
+            raise
+        except Exception:
+            metrics.upstream_errors.inc(animal=animal)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.upstream_seconds.observe(elapsed, animal=animal)
+            metrics.record("fetch", elapsed)
+        fresh = Animal(json["fact"], json["image"])
+        if self.corpus is not None:
+            try:
+                self.corpus.remember(animal, *fresh)
+            except Exception as e:
+                # a corpus that can't be written to is no reason to drop what we just got
+                print(f"Couldn't remember {animal}: {e!r}")
+        return fresh
+
+    def _stored(self, animal):
+        try:
+            stored = self.corpus.sample(animal) if self.corpus is not None else None
+        except Exception as e:
+            print(f"Couldn't read the {animal} corpus: {e!r}")
+            return None
+        return Animal(*stored) if stored else None
+
+    async def fetch(self, animal, key=None, background=False):
+        """
+        Returns an Animal(fact, image) from a single upstream request
+
+        Fetches with the same key (the animal by default) that overlap share a request.
+        `background` fetches wait for the gateway instead of being shed and don't
+        fall back to the corpus, nobody is waiting on them.
+        """
+        self._check_animal(animal)
+        animal = animal.lower()
+        if self.corpus is not None:
+            try:
+                await self.corpus.load(animal)
+            except Exception as e:
+                print(f"Couldn't load the {animal} corpus: {e!r}")
+        if self.mix and random.random() < self.mix:
+            stored = self._stored(animal)
+            if stored:
+                metrics.corpus_served.inc(animal=animal, reason="mix")
+                return stored
+        if self.gateway is not None:
+            task = asyncio.ensure_future(self.gateway.call(key or animal, lambda: self._get(animal), background))
+        else:
+            task = asyncio.ensure_future(self._get(animal))
+        if background:
+            return await task
+        try:
+            # shielded so a slow fetch still finishes and lands in the corpus
+            return await asyncio.wait_for(asyncio.shield(task), self.budget)
+        except asyncio.TimeoutError:
+            stored = self._stored(animal)
+            if stored is None:
+                return await task
+            task.add_done_callback(_quiet)
+            metrics.corpus_served.inc(animal=animal, reason="slow")
+            return stored
+        except Exception:
+            stored = self._stored(animal)
+            if stored is None:
+                raise
+            metrics.corpus_served.inc(animal=animal, reason="error")
+            return stored
+
+    async def fact(self, animal):
+        """
+        Returns a fact string of a given animal
+        """
+        return (await self.fetch(animal)).fact
+
+    async def picture(self, animal):
+        """
+        Returns a raw image link of a chosen animal (comes as str)
+        """
+        return (await self.fetch(animal)).image
+
+    async def download(self, url):
+        """
+        Returns the raw bytes of a picture link
+        """
+        async with self._session().get(url) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+def _quiet(task):
+    # nobody is awaiting this one anymore, don't let asyncio complain about its error
+    if not task.cancelled():
+        task.exception()
+
+
+animals = AnimalClient(
+    timeout=float(os.environ.get("ANIMAL_TIMEOUT", 5)),
+    corpus=corpus,
+    budget=float(os.environ.get("CORPUS_BUDGET", 1.5)),
+    mix=float(os.environ.get("CORPUS_MIX", 0)),
+    gateway=gateway,
+)
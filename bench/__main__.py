@@ -0,0 +1,183 @@
+"""
+Load test for the real commands, without Revolt or some-random-api.
+
+    python -m bench --users 50 --commands 20 --latency 0.2 --out bench.json
+
+Simulated users type commands into fake channels, the messages go through the
+bot's own message listener (prefix parsing, cooldowns, prefetch, gateway, ...)
+and every reply/send/edit is recorded instead of sent. Upstream is a local
+stand-in with configurable latency and errors. Results are printed as JSON.
+
+Only commands that got a real answer are timed, the ones cooldowns dropped or
+the gateway shed are just counted, per command, under "outcomes".
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+COMMANDS = ["test", "cat", "dog", "catfact", "dogfact", "pingcog"]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class StallMeter:
+    """Ticks every `interval` and adds up how late each tick was"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.total = 0.0
+        self.worst = 0.0
+        self.ticks = 0
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            late = max(0.0, loop.time() - start - self.interval)
+            self.total += late
+            self.worst = max(self.worst, late)
+            self.ticks += 1
+
+
+async def user(client, fakes, channel, commands, count, think, rng, busy, latencies, outcomes):
+    author = fakes.FakeUser(f"user{rng.random()}")
+    for _ in range(count):
+        name = rng.choice(commands)
+        message = fakes.IncomingMessage(f"^{name}", author, channel)
+        said = []
+        fakes.said.set(said)
+        start = time.perf_counter()
+        try:
+            await client.listeners["message"](message)
+        except Exception as e:
+            outcome = type(e).__name__
+        else:
+            # cooldowns drop a command without a word, shedding answers with the busy message
+            outcome = "dropped" if not said else "shed" if said[-1] == busy else "served"
+        if outcome == "served":
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+        counts = outcomes.setdefault(name, {})
+        counts[outcome] = counts.get(outcome, 0) + 1
+        if think:
+            await asyncio.sleep(rng.uniform(0, think))
+
+
+async def bench(args):
+    from bench import fakes
+    from bench.upstream import StandIn
+
+    upstream = StandIn(args.latency, args.jitter, args.error_rate, seed=args.seed)
+    url = await upstream.start()
+
+    import animalapi
+    import bot
+
+    animalapi.animals.url = url
+    bot.extensions.load_all()
+
+    from cogs.animals import BUSY
+    from gateway import gateway
+    from prefetch import pool
+
+    await asyncio.sleep(args.warmup)  # let the prefetch pool fill like it would after startup
+    requests_before = upstream.requests
+
+    recorder = fakes.Recorder(args.rest_latency)
+    shared = [fakes.FakeChannel(recorder) for _ in range(args.channels)] if args.channels else None
+    rng = random.Random(args.seed)
+    latencies, outcomes = {}, {}
+    stalls = StallMeter()
+    meter = asyncio.ensure_future(stalls.run())
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            user(
+                bot.client,
+                fakes,
+                rng.choice(shared) if shared else fakes.FakeChannel(recorder),
+                args.only or COMMANDS,
+                args.commands,
+                args.think,
+                random.Random(rng.random()),
+                BUSY,
+                latencies,
+                outcomes,
+            )
+            for _ in range(args.users)
+        ]
+    )
+    duration = time.perf_counter() - start
+    meter.cancel()
+
+    everything = [t for times in latencies.values() for t in times]
+    summary = lambda times: {
+        "count": len(times),
+        "mean": sum(times) / len(times) if times else None,
+        "p50": percentile(times, 50),
+        "p95": percentile(times, 95),
+        "p99": percentile(times, 99),
+        "max": max(times) if times else None,
+    }
+    await upstream.stop()
+    await animalapi.animals.close()
+    await bot.client.client.close()
+    return {
+        "config": vars(args),
+        "duration": duration,
+        # only commands that got a real answer, shed/dropped ones are counted in "outcomes"
+        "throughput": len(everything) / duration,
+        "latency": summary(everything),
+        "commands": {name: summary(latencies.get(name, [])) for name in sorted(outcomes)},
+        "outcomes": {name: counts for name, counts in sorted(outcomes.items())},
+        "rest_calls": recorder.counts(),
+        "upstream": {"requests": upstream.requests - requests_before, "errors": upstream.errors},
+        "loop": {"stall_total": stalls.total, "stall_max": stalls.worst, "ticks": stalls.ticks},
+        "gateway": gateway.stats(),
+        "prefetch": pool.stats(),
+    }
+
+
+def parse(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline load test for Meowie's commands")
+    parser.add_argument("--users", type=int, default=20, help="simulated users typing at once")
+    parser.add_argument("--commands", type=int, default=10, help="commands each user sends")
+    parser.add_argument("--only", nargs="+", choices=COMMANDS, help="only use these commands")
+    parser.add_argument("--channels", type=int, default=0, help="share this many channels (default: one per user)")
+    parser.add_argument("--think", type=float, default=0.0, help="max random pause between a user's commands")
+    parser.add_argument("--latency", type=float, default=0.1, help="stand-in upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests that 500")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="fake Revolt latency per reply/send/edit")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds to wait before starting")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", help="write the JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse(argv)
+    # fresh corpus per run unless one was given, so runs don't feed each other
+    os.environ.setdefault("CORPUS_DIR", tempfile.mkdtemp(prefix="meowie-corpus-"))
+    # the same loop voltage and bot.py's module level code use
+    result = asyncio.get_event_loop().run_until_complete(bench(args))
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    run()
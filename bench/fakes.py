@@ -0,0 +1,81 @@
+import asyncio
+import contextvars
+import itertools
+import time
+
+# Just enough of voltage's User/Channel/Message for CommandsClient.handle_commands
+# and CommandContext to work, with every reply/send/edit written down.
+
+_ids = itertools.count(1)
+# everything the command being run said (reply/send/edit content), set per command by the bench
+said = contextvars.ContextVar("said", default=None)
+
+
+class Recorder:
+    def __init__(self, rest_latency=0.0):
+        self.rest_latency = rest_latency
+        self.calls = []  # (op, channel id, perf_counter)
+
+    async def record(self, op, channel, content=None):
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        self.calls.append((op, channel.id, time.perf_counter()))
+        if said.get() is not None:
+            said.get().append(content)
+
+    def counts(self):
+        counts = {}
+        for op, _, _ in self.calls:
+            counts[op] = counts.get(op, 0) + 1
+        return counts
+
+
+class FakeUser:
+    def __init__(self, name):
+        self.id = f"user-{next(_ids)}"
+        self.name = name
+
+
+class FakeChannel:
+    def __init__(self, recorder):
+        self.id = f"channel-{next(_ids)}"
+        self.server = None
+        self.recorder = recorder
+
+    async def send(self, content=None, **kwargs):
+        await self.recorder.record("send", self, content)
+        return SentMessage(self, content, kwargs)
+
+    async def typing(self):
+        pass
+
+
+class SentMessage:
+    def __init__(self, channel, content, kwargs):
+        self.id = f"message-{next(_ids)}"
+        self.channel = channel
+        self.content = content
+        self.kwargs = kwargs
+        self.edits = []
+
+    async def edit(self, content=None, *, embed=None, embeds=None):
+        await self.channel.recorder.record("edit", self.channel, content)
+        self.edits.append((content, embed or embeds))
+
+
+class IncomingMessage:
+    """A message a simulated user typed"""
+
+    def __init__(self, content, author, channel):
+        self.id = f"message-{next(_ids)}"
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.server = None
+
+    async def reply(self, content=None, *, mention=True, **kwargs):
+        await self.channel.recorder.record("reply", self.channel, content)
+        return SentMessage(self.channel, content, kwargs)
+
+    async def delete(self, *, delay=None):
+        pass
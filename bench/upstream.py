@@ -0,0 +1,63 @@
+import asyncio
+import base64
+import random
+
+from aiohttp import web
+
+# 1x1 grey png, enough for anything that wants to download a picture
+PIXEL = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGNoAAAAggCBd81ytgAAAABJRU5ErkJggg=="
+)
+
+
+class StandIn:
+    """
+    Local copy of some-random-api's /animal/<animal> route.
+
+    Every response waits `latency` (+/- `jitter`) seconds and `error_rate` of them
+    come back as a 500, so the bot can be tried against a slow or flaky upstream.
+    """
+
+    def __init__(self, latency=0.1, jitter=0.0, error_rate=0.0, facts=50, images=50, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.facts = facts
+        self.images = images
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.url = None
+        self.runner = None
+
+    async def animal(self, request):
+        self.requests += 1
+        animal = request.match_info["animal"]
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": "injected"}, status=500)
+        return web.json_response(
+            {
+                "fact": f"{animal} fact #{self.random.randrange(self.facts)}",
+                "image": f"{self.url}/img/{animal}/{self.random.randrange(self.images)}.png",
+            }
+        )
+
+    async def image(self, request):
+        return web.Response(body=PIXEL, content_type="image/png")
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/animal/{animal}", self.animal)
+        app.router.add_get("/img/{animal}/{name}", self.image)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        await self.runner.cleanup()
@@ -0,0 +1,97 @@
+import voltage
+from voltage.ext import commands
+import asyncio
+import random
+from extensions import ExtensionManager
+from metrics import instrument, registry
+from outbox import install
+import os
+
+client = commands.CommandsClient(prefix="^")
+instrument(client)  # times every command, see /metrics
+extensions = ExtensionManager(client, "cogs")
+registry.collect(
+  "meowie_extension_load_seconds",
+  "How long importing + setting up each cog took",
+  lambda: {(path,): seconds for path, seconds in extensions.timings.items()},
+  ("extension",),
+)
+rotation = None
+
+# people allowed to reload cogs, comma separated user ids
+OWNERS = [owner for owner in os.environ.get("OWNERS", "").split(",") if owner]
+
+# , help_command="Help_Command_Here" make sure its a class
+
+async def status():
+  last = None
+  while True:
+    statuses = [
+      "Playing with catnips!",
+      "Meow!",
+      "Thank you Cesiyi and Mclnoot!",
+      "https://Meowie.mclaine1109.repl.co",
+      "Check out Mechabot.tk!",
+      "https://rvlt.gg/NpZnBaHE !"
+    ]
+    status = random.choice(statuses)
+    if status != last:  # same one again, no need to tell revolt
+      await client.set_status(status, voltage.PresenceType.online)
+      print(f"Set status to {status}")
+      last = status
+    await asyncio.sleep(10)
+
+async def supervise(func, delay=10):
+  # keeps func running, if it dies we print why and start it again
+  while True:
+    try:
+      await func()
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"{func.__name__} crashed: {e!r}, restarting in {delay}s")
+    await asyncio.sleep(delay)
+
+# ez bug fix
+# line 49-52 messed up the commands
+# I say the culprit is '@client.listen' or 'async def on_message'
+
+@client.listen("ready")
+async def ready():
+    # runs again on every reconnect, cogs are already loaded by then
+    global rotation
+    install(client)  # everything sent to revolt from now on is paced by outbox.py
+    print("komi!!! -",client.user)
+    if rotation is None or rotation.done():
+        rotation = client.loop.create_task(supervise(status))
+
+@client.command()
+async def test(ctx):
+    await ctx.send("> # SPREAD LUV! :ayame_heart: :girl_happy:")
+
+@client.command()
+async def reload(ctx, cog: str):
+    """Reloads (or loads) a cog without restarting. Owners only."""
+    if ctx.author.id not in OWNERS:
+        return
+    try:
+        extensions.reload(f"cogs.{cog}")
+    except Exception as e:  # whatever was loaded before still is
+        return await ctx.send(f"Couldn't reload {cog}: {e!r}")
+    await ctx.send(f"Reloaded {cog} in {extensions.timings[f'cogs.{cog}'] * 1000:.1f}ms")
+
+@client.command()
+async def unload(ctx, cog: str):
+    """Unloads a cog. Owners only."""
+    if ctx.author.id not in OWNERS:
+        return
+    try:
+        extensions.unload(f"cogs.{cog}")
+    except Exception as e:
+        return await ctx.send(f"Couldn't unload {cog}: {e!r}")
+    await ctx.send(f"Unloaded {cog}")
+
+# @client.listen("message")
+# async def on_message(message):
+#  if message.content.startswith("mew"):
+#    await message.channel.send(" mew!")
@@ -0,0 +1,57 @@
+import io
+import math
+import os
+
+import numpy as np
+
+# the picture work the image pool runs, kept top level so it pickles, and only
+# numpy and Pillow in here so the workers don't import the rest of the bot (see imaging._workers)
+
+THUMB = int(os.environ.get("THUMB_SIZE", 256))
+
+
+def thumbnail(data, size=THUMB):
+    """Decodes a picture and center-crops it to a size x size RGB bytestring"""
+    from PIL import Image  # only the workers need Pillow
+
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    side = min(image.size)
+    left, top = (image.width - side) // 2, (image.height - side) // 2
+    image = image.crop((left, top, left + side, top + side)).resize((size, size), Image.BILINEAR)
+    return image.tobytes()
+
+
+def _png(canvas):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.fromarray(canvas).save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+
+def _tiles(thumbs, size):
+    return [np.frombuffer(thumb, dtype=np.uint8).reshape(size, size, 3) for thumb in thumbs]
+
+
+def grid(thumbs, size=THUMB, columns=None):
+    """Tiles the thumbnails left to right, top to bottom, returns PNG bytes"""
+    tiles = _tiles(thumbs, size)
+    columns = columns or math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    canvas = np.zeros((rows * size, columns * size, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        row, column = divmod(i, columns)
+        canvas[row * size : (row + 1) * size, column * size : (column + 1) * size] = tile
+    return _png(canvas)
+
+
+def collage(thumbs, size=THUMB):
+    """First thumbnail big on the left, the rest in two rows next to it, returns PNG bytes"""
+    big, *rest = _tiles(thumbs, size)
+    columns = math.ceil(len(rest) / 2)
+    canvas = np.zeros((2 * size, (2 + columns) * size, 3), dtype=np.uint8)
+    canvas[:, : 2 * size] = big.repeat(2, axis=0).repeat(2, axis=1)
+    for i, tile in enumerate(rest):
+        column, row = divmod(i, 2)
+        canvas[row * size : (row + 1) * size, (2 + column) * size : (3 + column) * size] = tile
+    return _png(canvas)
@@ -1,9 +1,16 @@
 import voltage  # Import voltage.
-from animalpy import animals
+import imaging
+from animalapi import animals
+from gateway import Shed, gateway
+from outbox import outbox
+from prefetch import pool
 from voltage.ext import (
     commands,  # Importing the commands framework so we that we're able to create a Cog object.
 )
 
+BUSY = "2 many kats asked 4 rn, try again in a bit :c"
+
+
 def setup(client) -> commands.Cog:
 
     test = commands.Cog(  # Create a new Cog object.
@@ -15,28 +22,100 @@ def setup(client) -> commands.Cog:
         """Sends Pong!"""
         await ctx.reply("Pong from inside a Cog!")
 
+    @test.command()
+    async def prefetch(ctx):
+        """Shows how often the prefetch buffer had something ready."""
+        lines = [f"{animal}: {n['hits']} hits, {n['misses']} misses, {n['buffered']} ready" for animal, n in pool.stats().items()]
+        await ctx.send("\n".join(lines) or "Nothing prefetched yet.")
+
+    @test.command()
+    async def upstream(ctx):
+        """Shows how many animal requests got shed or shared."""
+        stats = gateway.stats()
+        await ctx.send(f"Shed: {stats['shed']['cooldown']} on cooldown, {stats['shed']['ratelimit']} over the rate limit. Shared: {stats['coalesced']}")
+
+    pool.warm("cat", "dog")
+
     @client.command()
     async def cat(ctx):
       """Kat pics!"""
+      if not gateway.allow(ctx):  # spammed, don't even bother
+        return
+      ready = pool.pop("cat")
+      if ready:  # already have one, no need for the loading message
+        return await ctx.reply("Hav kat pic!", embed=voltage.SendableEmbed(media=ready.image), mention=False)
+      if outbox.backlog(ctx.channel.id):  # revolt is already behind in here, send one message instead of two
+        catto = await animals.picture("cat")
+        return await ctx.reply("Hav kat pic!", embed=voltage.SendableEmbed(media=catto), mention=False)
       msg = await ctx.reply("Hav kat pic! (Embd loading... sry 4 waitin :c )", mention=False)
-      catto = animals.picture("cat")
+      try:
+        catto = await animals.picture("cat")
+      except Shed:  # answer in the loading message, not next to it
+        return await msg.edit(content=BUSY)
+      except Exception:
+        await msg.edit(content="No kat pic came :c")
+        raise
       await msg.edit(embed=voltage.SendableEmbed(media=catto), content="Hav kat pic!")
 
     @client.command()
     async def catfact(ctx):
       """Kat fun facts!! (some may be dark)"""
-      await ctx.send(animals.fact("cat"))
+      if not gateway.allow(ctx):
+        return
+      ready = pool.pop("cat")
+      await ctx.send(ready.fact if ready else await animals.fact("cat"))
 
     @client.command()
     async def dog(ctx):
       """Dog pics! >:( """
+      if not gateway.allow(ctx):
+        return
+      ready = pool.pop("dog")
+      if ready:  # already have one, no need for the loading message
+        return await ctx.reply("Hav dog pic! >:(", embed=voltage.SendableEmbed(media=ready.image), mention=False)
+      if outbox.backlog(ctx.channel.id):
+        catto = await animals.picture("dog")
+        return await ctx.reply("Hav dog pic! >:(", embed=voltage.SendableEmbed(media=catto), mention=False)
       msg = await ctx.reply("Hav dog pic! (Embd loading... sry 4 waitin :c )", mention=False)
-      catto = animals.picture("dog")
+      try:
+        catto = await animals.picture("dog")
+      except Shed:  # answer in the loading message, not next to it
+        return await msg.edit(content=BUSY)
+      except Exception:
+        await msg.edit(content="No dog pic came :c")
+        raise
       await msg.edit(embed=voltage.SendableEmbed(media=catto), content="Hav dog pic! >:(")
 
     @client.command()
     async def dogfact(ctx):
       """Dog fun facts!! >:( (some may be dark)"""
-      await ctx.send(animals.fact("dog"))
+      if not gateway.allow(ctx):
+        return
+      ready = pool.pop("dog")
+      await ctx.send(ready.fact if ready else await animals.fact("dog"))
+
+    @client.command()
+    async def catgrid(ctx):
+      """Lotsa kats in a grid!!"""
+      if not gateway.allow(ctx):
+        return
+      png = await imaging.render("cat", 4, imaging.grid)
+      await ctx.reply("Hav kat grid!", attachment=voltage.File(png, filename="catgrid.png"), mention=False)
+
+    @client.command()
+    async def dogcollage(ctx):
+      """Dog collage >:( """
+      if not gateway.allow(ctx):
+        return
+      png = await imaging.render("dog", 5, imaging.collage)
+      await ctx.reply("Hav dog collage! >:(", attachment=voltage.File(png, filename="dogcollage.png"), mention=False)
+
+    async def busy(error, ctx):
+      if isinstance(error, Shed):
+        return await ctx.send(BUSY)
+      raise error
+
+    for command in (cat, catfact, dog, dogfact, catgrid, dogcollage):
+      command.error(busy)
 
     return test  # Finally, return the cog object.
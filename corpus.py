@@ -0,0 +1,136 @@
+import asyncio
+import json
+import mmap
+import os
+import random
+import threading
+from hashlib import blake2b
+
+# one line per entry: "<kind> <json string>\n", kind is f(act) or i(mage)
+KINDS = {"f": "fact", "i": "image"}
+
+
+def _digest(kind, value):
+    return blake2b(f"{kind}{value}".encode(), digest_size=8).digest()
+
+
+class _Shelf:
+    """Offsets + hashes for one animal's append-only log"""
+
+    def __init__(self, path):
+        self.offsets = {kind: [] for kind in KINDS}
+        self.seen = set()
+        self.size = 0
+        self.skipped = 0
+        self.lock = threading.Lock()  # the file and indexes, never held while scanning
+        # a+b so it gets created the first time round
+        self.file = open(path, "a+b")
+        self.fd = self.file.fileno()
+        self._scan()
+
+    def _scan(self):
+        self.size = os.fstat(self.fd).st_size
+        if not self.size:
+            return
+        with mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset < self.size:
+                end = data.find(b"\n", offset)
+                if end == -1:
+                    # half-written tail from a crash, write over it next time
+                    self.size = offset
+                    self.file.truncate(offset)
+                    break
+                kind = chr(data[offset])
+                if kind in KINDS:
+                    try:
+                        value = json.loads(data[offset + 2 : end])
+                    except ValueError:
+                        # one mangled line shouldn't cost us the rest of the file
+                        self.skipped += 1
+                    else:
+                        self.offsets[kind].append(offset)
+                        self.seen.add(_digest(kind, value))
+                offset = end + 1
+        if self.skipped:
+            print(f"Skipped {self.skipped} unreadable lines in {self.file.name}")
+
+    def read(self, offset):
+        line = b""
+        while b"\n" not in line:
+            chunk = os.pread(self.fd, 4096, offset + len(line))
+            if not chunk:
+                raise ValueError(f"Corpus entry at {offset} has no end")
+            line += chunk
+        return json.loads(line[2 : line.index(b"\n")])
+
+    def add(self, kind, value):
+        digest = _digest(kind, value)
+        if digest in self.seen:
+            return False
+        line = f"{kind} {json.dumps(value)}\n".encode()
+        self.file.write(line)
+        self.file.flush()
+        self.offsets[kind].append(self.size)
+        self.seen.add(digest)
+        self.size += len(line)
+        return True
+
+
+class Corpus:
+    """
+    Every fact and picture link we've ever gotten, deduped, one log file per animal.
+
+    Files are only scanned the first time an animal is asked for, and only
+    offsets and 8 byte hashes stay in memory, so startup doesn't care how big it gets.
+    await load() first from the loop, the scan happens in a thread, and until it's
+    done remember() and sample() for that animal just do nothing instead of waiting.
+    """
+
+    def __init__(self, path="corpus"):
+        self.path = path
+        self.shelves = {}  # only ever has fully scanned shelves
+        self.scanning = {}  # animal -> lock so two threads don't scan the same log
+        self.lock = threading.Lock()  # just for the two dicts, held for no time
+
+    def _load(self, animal):
+        with self.lock:
+            scanning = self.scanning.setdefault(animal, threading.Lock())
+        # only executor threads ever wait here
+        with scanning:
+            if animal in self.shelves:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            shelf = _Shelf(os.path.join(self.path, f"{animal}.log"))
+            with self.lock:
+                self.shelves[animal] = shelf
+
+    async def load(self, animal):
+        """Scans an animal's log in a thread if that hasn't happened yet"""
+        animal = animal.lower()
+        if animal not in self.shelves:
+            await asyncio.get_event_loop().run_in_executor(None, self._load, animal)
+
+    def remember(self, animal, fact, image):
+        """Stores a fact and an image link, returns how many of them were new (0 if not loaded yet)"""
+        shelf = self.shelves.get(animal.lower())
+        if shelf is None:
+            return 0
+        with shelf.lock:
+            return shelf.add("f", fact) + shelf.add("i", image)
+
+    def sample(self, animal):
+        """Returns a random stored (fact, image), or None if we don't have both (or aren't loaded) yet"""
+        shelf = self.shelves.get(animal.lower())
+        if shelf is None:
+            return None
+        with shelf.lock:
+            if not shelf.offsets["f"] or not shelf.offsets["i"]:
+                return None
+            return shelf.read(random.choice(shelf.offsets["f"])), shelf.read(random.choice(shelf.offsets["i"]))
+
+    def __len__(self):
+        return sum(len(shelf.seen) for shelf in list(self.shelves.values()))
+
+
+corpus = Corpus(os.environ.get("CORPUS_DIR", "corpus"))
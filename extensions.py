@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+from importlib import import_module
+
+from voltage.ext.commands import Cog
+
+
+class ExtensionManager:
+    """
+    Loads the cogs in `folder` once, and can reload or unload one while running.
+
+    Unlike client.add_extension this keeps track of the commands a cog's setup()
+    added straight to the client (like cat and dog), so they go away on unload too,
+    and it doesn't import every module twice.
+    """
+
+    def __init__(self, client, folder="cogs"):
+        self.client = client
+        self.folder = folder
+        self.commands = {}  # extension -> command names its setup added
+        self.timings = {}  # extension -> seconds the import + setup took
+
+    def discover(self):
+        return [f"{self.folder}.{filename[:-3]}" for filename in sorted(os.listdir(self.folder)) if filename.endswith(".py")]
+
+    def load_all(self):
+        """Loads every cog that isn't loaded yet, safe to call again"""
+        for path in self.discover():
+            if path in self.commands:
+                continue
+            try:
+                self.load(path)
+                print(f"Just loaded {path} in {self.timings[path] * 1000:.1f}ms")
+            except Exception as e:
+                print(e)
+
+    def load(self, path):
+        if path in self.commands:
+            raise ValueError(f"Extension {path} is already loaded.")
+        start = time.perf_counter()
+        before = set(self.client.commands)
+        shared = list(Cog.commands)
+        cog = None
+        try:
+            module = import_module(path)
+            if not hasattr(module, "setup"):
+                raise AttributeError(f"Extension {path} does not have a setup function.")
+            cog = module.setup(self.client)
+            self.client.add_cog(cog)
+        except Exception:
+            # don't leave half a cog behind
+            for name in set(self.client.commands) - before:
+                del self.client.commands[name]
+            if cog is not None:
+                self.client.cogs.pop(cog.name, None)
+            # setup() may have made a Cog and added commands to the shared list before failing
+            Cog.commands[:] = shared
+            sys.modules.pop(path, None)
+            raise
+        self.client.extensions[path] = (module, cog.name)
+        self.commands[path] = [name for name in self.client.commands if name not in before]
+        self.timings[path] = time.perf_counter() - start
+
+    def unload(self, path):
+        module = self._detach(path)["module"]
+        if hasattr(module, "teardown"):
+            module.teardown(self.client)
+
+    def _detach(self, path):
+        """Takes a loaded extension out of the client, returns what _attach() needs to put it back"""
+        if path not in self.commands:
+            raise KeyError(f"Extension {path} is not loaded.")
+        module, name = self.client.extensions.pop(path)
+        cog = self.client.cogs.get(name)
+        names = self.commands.pop(path)
+        detached = {
+            "module": module,
+            "cog": cog,
+            "names": names,
+            # by cog too, a cog's own commands aren't in `names`
+            "commands": {
+                command: self.client.commands[command]
+                for command in self.client.commands
+                if command in names or (cog is not None and self.client.commands[command].cog is cog)
+            },
+            "cog_commands": [command for command in cog.commands if command.cog is cog] if cog is not None else [],
+            "timing": self.timings.pop(path, None),
+        }
+        if cog is not None:
+            self.client.remove_cog(cog)
+            # voltage's Cog keeps commands in a list shared by every Cog, drop this one's
+            # or they get added again (and clash) next time any cog is added
+            cog.commands[:] = [command for command in cog.commands if command.cog is not cog]
+        for command in names:
+            self.client.commands.pop(command, None)
+        sys.modules.pop(path, None)
+        return detached
+
+    def _attach(self, path, detached):
+        module, cog = detached["module"], detached["cog"]
+        sys.modules[path] = module
+        if cog is not None:
+            self.client.cogs[cog.name] = cog
+            cog.commands.extend(detached["cog_commands"])
+        self.client.commands.update(detached["commands"])
+        self.client.extensions[path] = (module, cog.name if cog is not None else None)
+        self.commands[path] = detached["names"]
+        if detached["timing"] is not None:
+            self.timings[path] = detached["timing"]
+
+    def reload(self, path):
+        """
+        Loads the new code for `path` and swaps it in, the old one keeps running if that fails.
+
+        The old module's teardown only runs once the new one is in.
+        """
+        if path not in self.commands:
+            return self.load(path)
+        old = self._detach(path)
+        try:
+            self.load(path)
+        except Exception:
+            self._attach(path, old)
+            raise
+        if hasattr(old["module"], "teardown"):
+            old["module"].teardown(self.client)
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+
+import metrics
+
+
+class Shed(Exception):
+    """Raised when the gateway turns a call away instead of hitting upstream"""
+
+
+class TokenBucket:
+    """`rate` calls a second on average, up to `burst` at once"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def available(self):
+        """Whole tokens there are right now"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return int(self.tokens)
+
+    def take(self, reserve=0):
+        """Takes a token if there's one left over after `reserve`, never waits"""
+        if self.available() < 1 + reserve:
+            return False
+        self.tokens -= 1
+        return True
+
+    def give(self):
+        """Puts back a token that ended up not being used"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    async def wait(self, reserve=0):
+        """Takes a token once there's one left over after `reserve`"""
+        while not self.take(reserve):
+            await asyncio.sleep((1 + reserve - self.tokens) / self.rate)
+
+
+class Gateway:
+    """
+    Everything that goes upstream goes through here.
+
+    Calls for the same key that overlap share one request, at most `concurrency`
+    requests are out at once and the token bucket caps how many we start.
+    Commands get shed when the bucket is empty, background calls wait instead and
+    leave the last `reserve` tokens for commands.
+    allow() is the cheap per-user/per-channel cooldown check commands do first.
+    """
+
+    def __init__(self, concurrency=4, rate=4.0, burst=20, reserve=8, user_cooldown=3.0, channel_cooldown=1.0):
+        if not 0 <= reserve < burst:
+            raise ValueError("reserve must be between 0 and burst")
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.reserve = reserve
+        self.user_cooldown = user_cooldown
+        self.channel_cooldown = channel_cooldown
+        self.semaphore = None
+        self.inflight = {}
+        self.users = {}
+        self.channels = {}
+        self.shed = {"cooldown": 0, "ratelimit": 0}
+        self.coalesced = 0
+
+    def allow(self, ctx):
+        """False (and counted as shed) if this user or channel used the command too recently"""
+        now = time.monotonic()
+        user = (ctx.author.id, ctx.command.name)
+        channel = (ctx.channel.id, ctx.command.name)
+        if now - self.users.get(user, -self.user_cooldown) < self.user_cooldown or now - self.channels.get(
+            channel, -self.channel_cooldown
+        ) < self.channel_cooldown:
+            self.shed["cooldown"] += 1
+            return False
+        self.users[user] = now
+        self.channels[channel] = now
+        if len(self.users) + len(self.channels) > 10000:
+            self._forget(now)
+        return True
+
+    def _forget(self, now):
+        # drop cooldowns that already ran out so these don't grow forever
+        self.users = {k: t for k, t in self.users.items() if now - t < self.user_cooldown}
+        self.channels = {k: t for k, t in self.channels.items() if now - t < self.channel_cooldown}
+
+    async def call(self, key, func, background=False):
+        """
+        Runs func() for key, or waits on the one already running
+
+        Without a token this raises Shed, unless it's a `background` call, then it
+        waits for one that isn't part of the reserve.
+        """
+        task = self.inflight.get(key)
+        if task is None and background:
+            await self.bucket.wait(self.reserve)
+            task = self.inflight.get(key)  # may have been started while we waited
+            if task is not None:
+                self.bucket.give()  # joining that one, no request of our own
+        elif task is None and not self.bucket.take():
+            self.shed["ratelimit"] += 1
+            raise Shed(f"Upstream rate limit reached, not fetching {key}")
+        if task is None:
+            task = self.inflight[key] = asyncio.ensure_future(self._run(func))
+            task.add_done_callback(lambda done: self.inflight.pop(key) if self.inflight.get(key) is done else None)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _run(self, func):
+        # made here so it belongs to the running loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            return await func()
+
+    def stats(self):
+        return {"shed": dict(self.shed), "coalesced": self.coalesced, "inflight": len(self.inflight)}
+
+
+gateway = Gateway(
+    concurrency=int(os.environ.get("UPSTREAM_CONCURRENCY", 4)),
+    rate=float(os.environ.get("UPSTREAM_RATE", 4)),
+    burst=int(os.environ.get("UPSTREAM_BURST", 20)),
+    reserve=int(os.environ.get("UPSTREAM_RESERVE", 8)),
+    user_cooldown=float(os.environ.get("USER_COOLDOWN", 3)),
+    channel_cooldown=float(os.environ.get("CHANNEL_COOLDOWN", 1)),
+)
+
+metrics.registry.collect(
+    "meowie_upstream_shed_total",
+    "Animal requests turned away before hitting upstream",
+    lambda: {(reason,): count for reason, count in gateway.shed.items()},
+    ("reason",),
+    "counter",
+)
+metrics.registry.collect(
+    "meowie_upstream_coalesced_total", "Animal requests that shared an in-flight request", lambda: {(): gateway.coalesced}, kind="counter"
+)
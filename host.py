@@ -1,19 +1,22 @@
-from flask import Flask
-from threading import Thread
-from animalpy import animals
+import asyncio
+import os
+import time
+from hashlib import sha1
+from aiohttp import web
+from animalapi import animals
+from metrics import registry
 
-app = Flask('')
+PAGE_TTL = float(os.environ.get("PAGE_TTL", 30))
+PAGE_RETRY = float(os.environ.get("PAGE_RETRY", 5))
 
-@app.route('/')
-def home(): 
-    return f"""
+PAGE = """
     <html>
         <body style=font-family:Verdana;text-align:center;background:#696969;>
             <h1>fun fac!</h1>
-            <p style='font-size:23'>{animals.fact("cat")}</p>
+            <p style='font-size:23'>{fact}</p>
             <iframe width=45% height=45% src='https://www.youtube.com/embed/UIp6_0kct_U?autoplay=1' frameborder='1' allow=autoplay;encrypted-media>a</iframe>
             <h1>hav kat pic!!!!!</h1>
-            <img src={animals.picture("cat")} alt='Cat pic' width=300px height=300px>
+            <img src={picture} alt='Cat pic' width=300px height=300px>
             <footer>
                 <hr style='background-color:black'>
                 <p><a href='https://speaklolcat.com' style='color:black'>lolspeak</a><br><a href='https://github.com/FanMclaine' style='color:black'>Mclnoot_</a><br><a href='https://vortex2571.neocities.org/cesiyi.html' style='color:black'>CascadingStyleSheets / Cesiyi</a></p>
@@ -22,9 +25,69 @@ def home():
     </html>
     """
 
-def run():
-  app.run(host='0.0.0.0', port=8080)
+class Page:
+    """
+    The rendered page, only re-rendered (one upstream fetch) every `ttl` seconds.
+
+    Once there is a page, requests never wait for a render, they get the old one
+    while it's redone in the background. A failed render is only tried again
+    after `retry` seconds.
+    """
+
+    def __init__(self, ttl, retry=5.0):
+        self.ttl = ttl
+        self.retry = retry
+        self.body = None
+        self.etag = None
+        self.expires = 0
+        self.refreshing = None
+        self.failed = None
+
+    async def get(self):
+        if self.refreshing is None and time.monotonic() >= self.expires:
+            self.refreshing = asyncio.ensure_future(self._render())
+            self.refreshing.add_done_callback(self._rendered)
+        if self.body is None:
+            # nothing to fall back on yet, wait for the render (everyone waits on the same one)
+            if self.refreshing is None:
+                raise self.failed
+            await asyncio.shield(self.refreshing)
+        return self.body, self.etag
+
+    def _rendered(self, task):
+        self.refreshing = None
+        if not task.cancelled() and task.exception() is not None:
+            # upstream hiccup, an old cat is better than an error page, and don't ask again right away
+            self.failed = task.exception()
+            self.expires = time.monotonic() + self.retry
+
+    async def _render(self):
+        fact, picture = await animals.fetch("cat")
+        self.body = PAGE.format(fact=fact, picture=picture).encode()
+        self.etag = f'"{sha1(self.body).hexdigest()}"'
+        self.expires = time.monotonic() + self.ttl
+
+page = Page(PAGE_TTL, PAGE_RETRY)
+
+async def home(request):
+    body, etag = await page.get()
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={int(page.ttl)}"}
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="text/html", headers=headers)
+
+async def metrics(request):
+    return web.Response(text=registry.render(), headers={"Content-Type": "text/plain; version=0.0.4"})
+
+app = web.Application()
+app.router.add_get('/', home)
+app.router.add_get('/metrics', metrics)
+
+async def run():
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host='0.0.0.0', port=8080).start()
 
-def alive():  
-    server = Thread(target=run)
-    server.start()
\ No newline at end of file
+def alive():
+    # served from the bot's own loop, it starts as soon as client.run() does
+    asyncio.get_event_loop().create_task(run())
@@ -0,0 +1,200 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+
+import metrics
+from animalapi import animals
+from canvas import THUMB, collage, grid, thumbnail
+from corpus import corpus
+from gateway import gateway
+
+
+class ThumbnailCache:
+    """
+    LRU of thumbnails keyed by source URL.
+
+    Up to `memory` bytes are kept in memory, whatever falls out of that is written
+    to `folder` (up to `disk` bytes, oldest deleted first) so it can come back
+    without downloading and decoding it again.
+    """
+
+    def __init__(self, folder="thumbs", memory=32 * 1024 * 1024, disk=256 * 1024 * 1024):
+        self.folder = folder
+        self.memory = memory
+        self.disk = disk
+        self.entries = OrderedDict()  # key -> thumbnail bytes
+        self.size = 0
+        self.spilled = None  # key -> bytes on disk, oldest first, read lazily
+        self.disk_size = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.lock = threading.Lock()  # the disk side runs in executor threads
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.rgb")
+
+    def _index(self):
+        with self.lock:
+            return self._scan()
+
+    def _scan(self):
+        if self.spilled is None:
+            os.makedirs(self.folder, exist_ok=True)
+            files = sorted(
+                (entry for entry in os.scandir(self.folder) if entry.name.endswith(".rgb")),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            self.spilled = OrderedDict((entry.name[:-4], entry.stat().st_size) for entry in files)
+            self.disk_size = sum(self.spilled.values())
+        return self.spilled
+
+    def _read(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def _spill(self, key, data):
+        spilled = self._scan()
+        if key not in spilled:
+            with open(self._path(key), "wb") as f:
+                f.write(data)
+            spilled[key] = len(data)
+            self.disk_size += len(data)
+        while self.disk_size > self.disk and spilled:
+            old, size = spilled.popitem(last=False)
+            self.disk_size -= size
+            try:
+                os.remove(self._path(old))
+            except FileNotFoundError:
+                pass
+
+    async def get(self, url):
+        key = sha1(url.encode()).hexdigest()
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits["memory"] += 1
+            return self.entries[key]
+        loop = asyncio.get_event_loop()
+        spilled = self.spilled if self.spilled is not None else await loop.run_in_executor(None, self._index)
+        if key in spilled:
+            try:
+                data = await loop.run_in_executor(None, self._read, key)
+            except FileNotFoundError:
+                spilled.pop(key, None)
+            else:
+                self.hits["disk"] += 1
+                await self._remember(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, url, data):
+        await self._remember(sha1(url.encode()).hexdigest(), data)
+
+    async def _remember(self, key, data):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        self.entries[key] = data
+        self.size += len(data)
+        evicted = []
+        while self.size > self.memory and len(self.entries) > 1:
+            old, old_data = self.entries.popitem(last=False)
+            self.size -= len(old_data)
+            evicted.append((old, old_data))
+        if evicted:
+            # disk writes go to a thread, not the loop
+            await asyncio.get_event_loop().run_in_executor(None, self._spill_all, evicted)
+
+    def _spill_all(self, evicted):
+        with self.lock:
+            for key, data in evicted:
+                self._spill(key, data)
+
+
+thumbs = ThumbnailCache(
+    os.environ.get("THUMB_DIR", "thumbs"),
+    memory=int(os.environ.get("THUMB_MEMORY_MB", 32)) * 1024 * 1024,
+    disk=int(os.environ.get("THUMB_DISK_MB", 256)) * 1024 * 1024,
+)
+workers = None
+loading = {}  # url -> task making its thumbnail, so two renders don't both do it
+
+metrics.registry.collect(
+    "meowie_thumbnail_cache_total",
+    "Thumbnail lookups by where they were found",
+    lambda: {("memory",): thumbs.hits["memory"], ("disk",): thumbs.hits["disk"], ("miss",): thumbs.misses},
+    ("result",),
+    "counter",
+)
+
+
+def _workers():
+    # made on first use so importing the cog doesn't start anything, and not
+    # forked, the loop's executor threads (and their locks) don't survive a fork.
+    # the forkserver only preloads canvas.py, not __main__ (the whole bot)
+    global workers
+    if workers is None:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["canvas"])
+        workers = ProcessPoolExecutor(max_workers=int(os.environ.get("IMAGE_WORKERS", 2)), mp_context=context)
+    return workers
+
+
+async def pictures(animal, count):
+    """
+    Up to `count` different picture links.
+
+    Taken from the corpus first, and only what's still missing is fetched, no more
+    at once than the gateway has tokens for. The prefetch buffer is left to ^cat/^dog.
+    """
+    await corpus.load(animal)
+    links = []
+    for _ in range(2 * count):  # samples can repeat, give it a few tries
+        if len(set(links)) >= count or not (stored := corpus.sample(animal)):
+            break
+        links.append(stored[1])
+    links = list(dict.fromkeys(links))
+    # at least one, so an empty grid still gets shed (and told so) like any other command
+    missing = min(count - len(links), max(gateway.bucket.available(), 0 if links else 1))
+    # different keys so the gateway doesn't hand every one of these the same picture
+    fetched = await asyncio.gather(
+        *[animals.fetch(animal, key=f"{animal}:{i}") for i in range(missing)], return_exceptions=True
+    )
+    errors = [payload for payload in fetched if isinstance(payload, Exception)]
+    links += [payload.image for payload in fetched if not isinstance(payload, Exception)]
+    if not links:
+        raise errors[0]
+    return list(dict.fromkeys(links))
+
+
+async def _make_thumbnail(url):
+    data = await thumbs.get(url)
+    if data is None:
+        raw = await animals.download(url)
+        data = await asyncio.get_event_loop().run_in_executor(_workers(), thumbnail, raw, THUMB)
+        await thumbs.put(url, data)
+    return data
+
+
+async def _thumbnail(url):
+    task = loading.get(url)
+    if task is None:
+        task = loading[url] = asyncio.ensure_future(_make_thumbnail(url))
+        task.add_done_callback(lambda _: loading.pop(url, None))
+    return await asyncio.shield(task)
+
+
+async def render(animal, count, layout=grid):
+    """Downloads `count` pictures of `animal` in parallel and lays them out, returns PNG bytes"""
+    links = await pictures(animal, count)
+    with metrics.timed("download"):
+        tiles = await asyncio.gather(*[_thumbnail(url) for url in links], return_exceptions=True)
+    tiles = [tile for tile in tiles if not isinstance(tile, Exception)]
+    if not tiles:
+        raise ValueError(f"Couldn't get any {animal} pictures")
+    with metrics.timed("render"):
+        return await asyncio.get_event_loop().run_in_executor(_workers(), layout, tiles, THUMB)
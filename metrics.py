@@ -0,0 +1,234 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# seconds, fixed so every histogram is a handful of ints no matter how long we run
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# which command (if any) the current task is working for, and when its message came in
+command = ContextVar("command", default="background")
+received = ContextVar("received", default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def lines(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[tuple(labels[name] for name in self.labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        counts = self.values.get(key)
+        if counts is None:
+            counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def lines(self):
+        for key, counts in self.values.items():
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                total += count
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), key + (bound,))} {total}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {counts[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {total}"
+
+
+class Collected(Counter):
+    """Values read from somewhere else when scraped, `read` returns {label values: value}"""
+
+    def __init__(self, name, help, read, labels=(), kind="gauge"):
+        super().__init__(name, help, labels)
+        self.read = read
+        self.kind = kind
+
+    def lines(self):
+        self.values = self.read()
+        return super().lines()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def collect(self, name, help, read, labels=(), kind="gauge"):
+        return self.add(Collected(name, help, read, labels, kind))
+
+    def render(self):
+        """Everything in Prometheus' text format"""
+        out = []
+        for metric in self.metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+command_seconds = registry.histogram("meowie_command_seconds", "Time from message to command finishing", ("command",))
+command_phase_seconds = registry.histogram(
+    "meowie_command_phase_seconds", "Time spent per phase (parse, fetch, send, edit) of a command", ("command", "phase")
+)
+command_errors = registry.counter("meowie_command_errors_total", "Commands that raised", ("command",))
+upstream_seconds = registry.histogram("meowie_upstream_seconds", "Animal API request time", ("animal",))
+upstream_errors = registry.counter("meowie_upstream_errors_total", "Animal API requests that failed", ("animal",))
+upstream_timeouts = registry.counter("meowie_upstream_timeouts_total", "Animal API requests that timed out", ("animal",))
+corpus_served = registry.counter(
+    "meowie_corpus_served_total", "Fetches answered from the corpus instead of upstream", ("animal", "reason")
+)
+loop_lag_seconds = registry.histogram(
+    "meowie_loop_lag_seconds", "How late the event loop woke up a sleeping task", buckets=LAG_BUCKETS
+)
+loop_lag_last = registry.gauge("meowie_loop_lag_last_seconds", "The most recent loop lag sample")
+
+
+def record(phase, seconds):
+    """Adds seconds to a phase of whatever command the current task is running"""
+    command_phase_seconds.observe(seconds, command=command.get(), phase=phase)
+
+
+@contextmanager
+def timed(phase):
+    """`with timed("send"):` records the block as a phase of the current command"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+class _TimedMessage:
+    # voltage messages have __slots__, so wrap instead of patching edit on them
+    __slots__ = ("message",)
+
+    def __init__(self, message):
+        self.message = message
+
+    def __getattr__(self, name):
+        return getattr(self.message, name)
+
+    async def edit(self, *args, **kwargs):
+        with timed("edit"):
+            return await self.message.edit(*args, **kwargs)
+
+
+def _timed_send(func):
+    @wraps(func)
+    async def send(*args, **kwargs):
+        with timed("send"):
+            message = await func(*args, **kwargs)
+        return _TimedMessage(message) if message is not None else None
+
+    return send
+
+
+def _wrap(cmd):
+    func = cmd.func
+
+    @wraps(func)
+    async def run(*args, **kwargs):
+        ctx = args[1] if cmd.subclassed else args[0]
+        token = command.set(cmd.name)
+        start = received.get()
+        if start is not None:
+            record("parse", time.perf_counter() - start)
+        ctx.reply = _timed_send(ctx.reply)
+        ctx.send = _timed_send(ctx.send)
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            from gateway import Shed  # gateway imports us, so not at the top
+
+            # shed commands get a "too busy" reply, they're counted in meowie_upstream_shed_total
+            if not isinstance(e, Shed):
+                command_errors.inc(command=cmd.name)
+            raise
+        finally:
+            if start is not None:
+                command_seconds.observe(time.perf_counter() - start, command=cmd.name)
+            command.reset(token)
+
+    run.timed = True
+    cmd.func = run
+
+
+def instrument(client, lag_interval=0.5):
+    """
+    Times every command the client has, including ones added later by cogs,
+    and starts sampling event loop lag.
+    """
+    handle = client.listeners["message"]
+
+    async def message(message):
+        received.set(time.perf_counter())
+        for cmd in client.commands.values():
+            if not getattr(cmd.func, "timed", False):
+                _wrap(cmd)
+        return await handle(message)
+
+    client.listeners["message"] = message
+    asyncio.ensure_future(sample_lag(lag_interval))
+
+
+async def sample_lag(interval=0.5):
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        loop_lag_seconds.observe(lag)
+        loop_lag_last.set(lag)
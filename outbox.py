@@ -0,0 +1,240 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from hashlib import sha256
+
+import voltage
+from voltage.internals import HTTPHandler
+
+import metrics
+
+# a message's own id at the end of a route, dropped so edits and sends in a channel share a queue
+MESSAGE_ID = re.compile(r"(channels/[^/]+/messages)/[^/]+$")
+
+
+def route(url):
+    return MESSAGE_ID.sub(r"\1", url.split("?")[0])
+
+
+class Job:
+    __slots__ = ("method", "url", "auth", "kwargs", "future", "tries")
+
+    def __init__(self, method, url, auth, kwargs, future):
+        self.method = method
+        self.url = url
+        self.auth = auth
+        self.kwargs = kwargs
+        self.future = future
+        self.tries = 0
+
+
+class Bucket:
+    """What revolt last told us about one rate limit bucket"""
+
+    __slots__ = ("remaining", "reset_at")
+
+    def __init__(self):
+        self.remaining = 1
+        self.reset_at = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        if self.remaining <= 0 and now < self.reset_at:
+            await asyncio.sleep(self.reset_at - now)
+
+
+class Outbox:
+    """
+    Queues every request voltage makes, one queue per route, and paces them
+    using the X-RateLimit-* headers revolt sends back instead of finding out via 429s.
+
+    A PATCH to something that's still waiting in the queue (a second edit of the
+    same message, another status change) is merged into the waiting one, so only
+    the newest version gets sent.
+    """
+
+    def __init__(self, retries=3):
+        self.retries = retries
+        self.queues = {}  # route -> deque of jobs
+        self.workers = {}  # route -> task draining it
+        self.buckets = {}  # revolt's bucket name -> Bucket
+        self.bucket_of = {}  # route -> revolt's bucket name
+        self.collapsed = 0
+        self.limited = 0
+
+    def backlog(self, channel_id):
+        """How many message sends/edits are waiting for this channel"""
+        return len(self.queues.get(f"channels/{channel_id}/messages", ()))
+
+    async def request(self, http, method, url, auth=True, **kwargs):
+        key = route(url)
+        queue = self.queues.setdefault(key, deque())
+        if method == "PATCH":
+            for job in queue:
+                if job.method == "PATCH" and job.url == url and "json" in job.kwargs and "json" in kwargs:
+                    job.kwargs["json"] = {**job.kwargs["json"], **kwargs["json"]}
+                    self.collapsed += 1
+                    return await asyncio.shield(job.future)
+        job = Job(method, url, auth, kwargs, asyncio.get_event_loop().create_future())
+        queue.append(job)
+        worker = self.workers.get(key)
+        if worker is None or worker.done():
+            self.workers[key] = asyncio.ensure_future(self._drain(http, key, queue))
+        return await asyncio.shield(job.future)
+
+    async def _drain(self, http, key, queue):
+        while queue:
+            job = queue[0]
+            bucket = self.buckets.get(self.bucket_of.get(key))
+            if bucket is not None:
+                await bucket.wait()
+            # only taken off once it's really going out, until then PATCHes can still merge into it
+            queue.popleft()
+            try:
+                result = await self._send(http, key, job)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            if result is _RETRY:
+                queue.appendleft(job)
+            elif not job.future.done():
+                job.future.set_result(result)
+        # nothing awaits between the empty check and here, a new request makes both again
+        if self.queues.get(key) is queue:
+            del self.queues[key]
+        if self.workers.get(key) is asyncio.current_task():
+            del self.workers[key]
+
+    async def _send(self, http, key, job):
+        headers = {"User-Agent": "Voltage (beta)", "Content-Type": "application/json"}
+        if job.auth:
+            headers["x-bot-token" if http.bot else "x-session-token"] = http.token
+        async with http.client.request(job.method, http.api_url + job.url, headers=headers, **job.kwargs) as response:
+            self._track(key, response.headers)
+            if response.status == 429:
+                self.limited += 1
+                job.tries += 1
+                if job.tries > self.retries:
+                    raise voltage.HTTPError(response)
+                try:
+                    retry_after = (await response.json()).get("retry_after", 1000) / 1000
+                except Exception:
+                    retry_after = 1.0
+                bucket = self.buckets.setdefault(self.bucket_of.get(key, key), Bucket())
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, time.monotonic() + retry_after)
+                self.bucket_of.setdefault(key, key)
+                return _RETRY
+            if 200 <= response.status <= 300:
+                if (await response.read()) == b"":
+                    return {}
+                return await response.json()
+            elif response.status == 403:
+                raise voltage.PermissionError()
+            raise voltage.HTTPError(response)
+
+    def _track(self, key, headers):
+        name = headers.get("X-RateLimit-Bucket")
+        if name is None:
+            return
+        self.bucket_of[key] = name
+        bucket = self.buckets.setdefault(name, Bucket())
+        try:
+            bucket.remaining = int(headers.get("X-RateLimit-Remaining", 1))
+            bucket.reset_at = time.monotonic() + int(headers.get("X-RateLimit-Reset-After", 0)) / 1000
+        except ValueError:
+            pass
+
+    def queued(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+
+_RETRY = object()
+
+
+class MediaCache:
+    """
+    Embed media links -> autumn file ids, so the same picture is only uploaded once.
+
+    voltage otherwise downloads and re-uploads an embed's media on every send.
+    Pictures are matched by link first and then by a sha256 of their bytes, so the
+    same image under a different link isn't uploaded again either.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.by_url = OrderedDict()
+        self.by_hash = OrderedDict()
+        self.uploads = 0
+        self.hits = 0
+
+    def _keep(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.size:
+            cache.popitem(last=False)
+
+    async def id(self, http, url):
+        if url in self.by_url:
+            self.by_url.move_to_end(url)
+            self.hits += 1
+            return self.by_url[url]
+        data = await http.get_file_binary(url.split("?")[0])
+        digest = sha256(data).digest()
+        if digest in self.by_hash:
+            self.hits += 1
+            file_id = self.by_hash[digest]
+        else:
+            self.uploads += 1
+            file_id = (await http.upload_file(data, "Attachment", "attachments"))["id"]
+            self._keep(self.by_hash, digest, file_id)
+        self._keep(self.by_url, url, file_id)
+        return file_id
+
+
+class ScheduledHTTPHandler(HTTPHandler):
+    # no new slots so an existing handler can just switch class, see install()
+    __slots__ = ()
+
+    async def request(self, method, url, auth=True, **kwargs):
+        return await outbox.request(self, method, url, auth, **kwargs)
+
+    async def handle_embed(self, embed_data):
+        if media is None or not isinstance(embed_data, voltage.SendableEmbed) or not isinstance(embed_data.media, str):
+            return await super().handle_embed(embed_data)
+        embed = await voltage.SendableEmbed(
+            title=embed_data.title,
+            description=embed_data.description,
+            url=embed_data.url,
+            colour=embed_data.colour,
+            icon_url=embed_data.icon_url,
+        ).to_dict(self)
+        embed["media"] = await media.id(self, embed_data.media)
+        return embed
+
+
+def install(client):
+    """Routes the client's requests through the outbox, call once client.http exists (on ready)"""
+    if not isinstance(client.http, ScheduledHTTPHandler):
+        client.http.__class__ = ScheduledHTTPHandler
+
+
+outbox = Outbox(retries=int(os.environ.get("OUTBOX_RETRIES", 3)))
+# off by default, only turn on if autumn ids can be used in more than one message
+media = MediaCache(int(os.environ.get("MEDIA_CACHE_SIZE", 1024))) if os.environ.get("REHOST_MEDIA") else None
+
+metrics.registry.collect("meowie_outbox_queued", "Requests waiting to go to revolt", lambda: {(): outbox.queued()})
+metrics.registry.collect(
+    "meowie_outbox_collapsed_total", "Edits/status changes merged into one still waiting", lambda: {(): outbox.collapsed}, kind="counter"
+)
+metrics.registry.collect("meowie_outbox_ratelimited_total", "429s revolt sent back", lambda: {(): outbox.limited}, kind="counter")
+metrics.registry.collect(
+    "meowie_media_uploads_total",
+    "Embed pictures uploaded vs reused",
+    lambda: {("upload",): media.uploads, ("reused",): media.hits} if media else {},
+    ("result",),
+    "counter",
+)
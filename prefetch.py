@@ -0,0 +1,94 @@
+import asyncio
+import os
+from collections import deque
+
+import metrics
+from animalapi import animals
+
+
+class PrefetchPool:
+    """
+    Keeps a few ready-to-send Animal payloads per animal.
+
+    Once a buffer drops below `low` a background task tops it back up to `high`,
+    so commands can usually answer from memory instead of waiting on upstream.
+    """
+
+    def __init__(self, client, low=2, high=6):
+        if not 0 <= low <= high:
+            raise ValueError("low must be between 0 and high")
+        self.client = client
+        self.low = low
+        self.high = high
+        self.buffers = {}
+        self.tasks = {}
+        self.hits = {}
+        self.misses = {}
+
+    def warm(self, *animals):
+        """Starts filling the buffers for the given animals"""
+        for animal in animals:
+            self.buffers.setdefault(animal, deque(maxlen=self.high))
+            self._refill(animal)
+
+    def pop(self, animal):
+        """Returns a buffered Animal, or None if we're out"""
+        buffer = self.buffers.setdefault(animal, deque(maxlen=self.high))
+        if buffer:
+            self.hits[animal] = self.hits.get(animal, 0) + 1
+            payload = buffer.popleft()
+        else:
+            self.misses[animal] = self.misses.get(animal, 0) + 1
+            payload = None
+        if len(buffer) < self.low:
+            self._refill(animal)
+        return payload
+
+    def _refill(self, animal):
+        task = self.tasks.get(animal)
+        if task is None or task.done():
+            self.tasks[animal] = asyncio.ensure_future(self._fill(animal))
+
+    async def _fill(self, animal):
+        # this task may have been started from inside a command, it isn't part of it though
+        metrics.command.set("background")
+        buffer = self.buffers[animal]
+        while len(buffer) < self.high:
+            try:
+                # own key so a command's fetch never shares (and repeats) one meant for the buffer
+                buffer.append(await self.client.fetch(animal, key=f"{animal}:prefetch", background=True))
+            except Exception as e:
+                # upstream is sad, commands will fall back to fetching themselves
+                print(f"Prefetch for {animal} failed: {e!r}")
+                return
+
+    def stats(self):
+        """Hit/miss counts and current fill per animal"""
+        return {
+            animal: {
+                "hits": self.hits.get(animal, 0),
+                "misses": self.misses.get(animal, 0),
+                "buffered": len(buffer),
+            }
+            for animal, buffer in self.buffers.items()
+        }
+
+
+def _counts(counts):
+    return lambda: {(animal,): count for animal, count in counts.items()}
+
+
+pool = PrefetchPool(
+    animals,
+    low=int(os.environ.get("PREFETCH_LOW", 2)),
+    high=int(os.environ.get("PREFETCH_HIGH", 6)),
+)
+
+metrics.registry.collect("meowie_prefetch_hits_total", "Commands answered from the prefetch buffer", _counts(pool.hits), ("animal",), "counter")
+metrics.registry.collect("meowie_prefetch_misses_total", "Commands that found the prefetch buffer empty", _counts(pool.misses), ("animal",), "counter")
+metrics.registry.collect(
+    "meowie_prefetch_buffered",
+    "Payloads waiting in the prefetch buffer",
+    lambda: {(animal,): len(buffer) for animal, buffer in pool.buffers.items()},
+    ("animal",),
+)